@@ -1,34 +1,70 @@
 import os
-from typing import Dict, Any
+from types import MappingProxyType
+from typing import Mapping, Any
+from functools import lru_cache
 from dotenv import load_dotenv
 
-# Load environment variables from .env file if it exists
-load_dotenv()
+@lru_cache(maxsize=1)
+def _env_snapshot() -> Mapping[str, str]:
+    """Load .env (if present) once and freeze the environment for the settings read at import."""
+    # Deployments that inject the environment skip the filesystem search for .env
+    if not os.getenv('THIRD_LAW_NO_DOTENV'):
+        load_dotenv()
+    return MappingProxyType(dict(os.environ))
+
+def getenv(key: str, default: str = '') -> str:
+    """Read a variable from the environment snapshot"""
+    return _env_snapshot().get(key, default)
+
+_TRUE = frozenset(('true', '1', 'yes', 'on'))
 
 def get_env_bool(key: str, default: bool = False) -> bool:
     """Convert environment variable to boolean"""
-    value = os.getenv(key, str(default)).lower()
-    return value in ('true', '1', 'yes', 'on')
+    value = _env_snapshot().get(key)
+    if value is None:
+        return default
+    return value.lower() in _TRUE
 
 class Settings:
     """Application settings loaded from environment variables"""
     
     # ClickHouse settings
-    CLICKHOUSE_HOST: str = os.getenv('CLICKHOUSE_HOST', 'localhost')
-    CLICKHOUSE_PORT: int = int(os.getenv('CLICKHOUSE_PORT', '9440'))
-    CLICKHOUSE_USER: str = os.getenv('CLICKHOUSE_USER', 'default')
-    CLICKHOUSE_PASSWORD: str = os.getenv('CLICKHOUSE_PASSWORD', '')
+    CLICKHOUSE_HOST: str = getenv('CLICKHOUSE_HOST', 'localhost')
+    CLICKHOUSE_PORT: int = int(getenv('CLICKHOUSE_PORT', '9440'))
+    CLICKHOUSE_USER: str = getenv('CLICKHOUSE_USER', 'default')
+    CLICKHOUSE_PASSWORD: str = getenv('CLICKHOUSE_PASSWORD', '')
     CLICKHOUSE_SECURE: bool = get_env_bool('CLICKHOUSE_SECURE', True)
-    CLICKHOUSE_DATABASE: str = os.getenv('CLICKHOUSE_DATABASE', 'default')
+    CLICKHOUSE_DATABASE: str = getenv('CLICKHOUSE_DATABASE', 'default')
+    # Wire compression: lz4, lz4hc or zstd (zstd needs clickhouse-driver[zstd]); 'none' disables it
+    CLICKHOUSE_COMPRESSION: str = getenv('CLICKHOUSE_COMPRESSION', 'lz4')
+    CLICKHOUSE_POOL_MIN: int = int(getenv('CLICKHOUSE_POOL_MIN', '4'))
+    CLICKHOUSE_POOL_SIZE: int = int(getenv('CLICKHOUSE_POOL_SIZE', str(min(32, (os.cpu_count() or 1) * 2))))
+    CLICKHOUSE_POOL_PROBE_INTERVAL: float = float(getenv('CLICKHOUSE_POOL_PROBE_INTERVAL', '30'))
+    
+    # Insert batching settings
+    INSERT_BATCH_SIZE: int = int(getenv('INSERT_BATCH_SIZE', '1000'))
+    INSERT_FLUSH_MS: int = int(getenv('INSERT_FLUSH_MS', '100'))
+    WRITE_QUEUE_SIZE: int = int(getenv('WRITE_QUEUE_SIZE', '1024'))
+    
+    # Read cache settings
+    DOCUMENT_CACHE_SIZE: int = int(getenv('DOCUMENT_CACHE_SIZE', '1024'))
+    DOCUMENT_CACHE_TTL: float = float(getenv('DOCUMENT_CACHE_TTL', '60'))
+    STATISTICS_CACHE_TTL: float = float(getenv('STATISTICS_CACHE_TTL', '5'))
+    NEGATIVE_CACHE_TTL: float = float(getenv('NEGATIVE_CACHE_TTL', '10'))
     
     # API settings
-    API_HOST: str = os.getenv('API_HOST', '0.0.0.0')
-    API_PORT: int = int(os.getenv('API_PORT', '8001'))
+    API_HOST: str = getenv('API_HOST', '0.0.0.0')
+    API_PORT: int = int(getenv('API_PORT', '8001'))
+    HEALTH_CHECK_TTL: float = float(getenv('HEALTH_CHECK_TTL', '2'))
+    MAX_UPLOAD_BYTES: int = int(getenv('MAX_UPLOAD_BYTES', str(50 * 1024 * 1024)))
+    # Web worker processes (same default as gunicorn.conf.py); each runs its own extraction pool
+    WEB_CONCURRENCY: int = int(getenv('WEB_CONCURRENCY', str(max(2, (os.cpu_count() or 1) // 2))))
+    # Extraction processes per web worker; by default the cores are split between the workers
+    PDF_WORKERS: int = int(getenv('PDF_WORKERS', str(max(1, (os.cpu_count() or 1) // WEB_CONCURRENCY))))
     
-    @property
-    def clickhouse_settings(self) -> Dict[str, Any]:
-        """Get ClickHouse connection settings"""
-        return {
+    def __init__(self):
+        # Build the derived settings once; they are read on every client construction
+        self.clickhouse_settings: Mapping[str, Any] = MappingProxyType({
             'host': self.CLICKHOUSE_HOST,
             'port': self.CLICKHOUSE_PORT,
             'user': self.CLICKHOUSE_USER,
@@ -38,15 +74,11 @@ class Settings:
             'settings': {
                 'max_execution_time': 60
             }
-        }
-    
-    @property
-    def api_settings(self) -> Dict[str, Any]:
-        """Get API server settings"""
-        return {
+        })
+        self.api_settings: Mapping[str, Any] = MappingProxyType({
             'host': self.API_HOST,
             'port': self.API_PORT
-        }
+        })
 
 # Create global settings instance
 settings = Settings() 
\ No newline at end of file
@@ -1,345 +1,798 @@
 from clickhouse_driver import Client
-from typing import Dict, Any, Optional, List
-import json
-from datetime import datetime
+from clickhouse_driver.errors import ErrorCodes, NetworkError, ServerException, SocketTimeoutError
+from typing import Dict, Any, Optional, List, Final, ClassVar, Set, Tuple
+import orjson
+import re
 import time
+import random
 import logging
 from contextlib import contextmanager
-from queue import Queue, Empty
+from functools import wraps
+from queue import LifoQueue, Empty
 import threading
 
+from .cache import TTLCache
+from .config import settings
+
 logger = logging.getLogger(__name__)
 
+_DOCUMENT_ID_RE = re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}')
+
+_Q_CHECK_TABLE: Final[str] = """
+SELECT engine_full
+FROM system.tables
+WHERE database = currentDatabase()
+AND name = {table:String}
+"""
+
+# One row per filename: re-uploads insert a row with a higher version and the engine
+# keeps that one. The version is assigned by the client (time.time_ns()) because the
+# server stamps every row of an INSERT, or of a coalesced async insert, alike
+_Q_CREATE_TABLE: Final[str] = """
+CREATE TABLE IF NOT EXISTS documents (
+    document_id String,
+    filename String,
+    version UInt64,
+    upload_timestamp DateTime64(3, 'UTC') DEFAULT now64(3, 'UTC'),
+    content String CODEC(ZSTD(3)),
+    content_length UInt32 MATERIALIZED lengthUTF8(content),
+    analysis_result String CODEC(ZSTD(3)),
+    sensitive_info_count UInt32,
+    email_count UInt32,
+    ssn_count UInt32,
+    INDEX idx_document_id document_id TYPE bloom_filter(0.01) GRANULARITY 4
+)
+ENGINE = ReplacingMergeTree(version)
+ORDER BY filename
+SETTINGS index_granularity = 8192
+"""
+
+# Matches the versioned engine, including the Replicated*/Shared* variants used by
+# replicated and cloud servers, which list their path arguments before the version
+_VERSIONED_ENGINE_RE = re.compile(r'ReplacingMergeTree\((?:[^()]*, )?version\)')
+
+# content_length is materialized, so it is left out of the copy; legacy tables
+# have no version column, so rows are versioned by their upload time
+_Q_COPY_LEGACY: Final[str] = """
+INSERT INTO documents (
+    document_id, filename, version, upload_timestamp, content, analysis_result,
+    sensitive_info_count, email_count, ssn_count
+)
+SELECT
+    document_id, filename, toUnixTimestamp64Nano(toDateTime64(upload_timestamp, 9, 'UTC')),
+    upload_timestamp, content, analysis_result,
+    sensitive_info_count, email_count, ssn_count
+FROM {table}
+"""
+
+# Server-computed columns, which tables created before that change lack
+_Q_COLUMN_DEFAULTS: Final[str] = """
+SELECT name, default_kind
+FROM system.columns
+WHERE database = currentDatabase()
+AND table = 'documents'
+AND name IN ('upload_timestamp', 'content_length')
+"""
+
+# Text columns not yet stored with the ZSTD codec (tables created before it was added)
+_Q_UNCOMPRESSED_COLUMNS: Final[str] = """
+SELECT name
+FROM system.columns
+WHERE database = currentDatabase()
+AND table = 'documents'
+AND name IN ('content', 'analysis_result')
+AND compression_codec != 'CODEC(ZSTD(3))'
+"""
+
+# upload_timestamp is stamped by the server (DEFAULT now64)
+_Q_INSERT_DOCS: Final[str] = """
+INSERT INTO documents (
+    document_id, filename, content, analysis_result,
+    sensitive_info_count, email_count, ssn_count, version
+) VALUES
+"""
+
+# Finds the row through the document_id bloom filter instead of merging the whole
+# table with FINAL (which ignores skip indexes), then keeps it only if it is still
+# the latest upload of its filename, a primary-key lookup
+_BY_DOCUMENT_ID: Final[str] = """
+FROM documents
+WHERE document_id = {document_id:String}
+AND document_id = (
+    SELECT argMax(document_id, version)
+    FROM documents
+    WHERE filename IN (
+        SELECT filename
+        FROM documents
+        WHERE document_id = {document_id:String}
+    )
+)
+LIMIT 1
+"""
+
+_Q_GET_DOC: Final[str] = f"""
+SELECT
+    document_id,
+    filename,
+    upload_timestamp,
+    content,
+    content_length,
+    analysis_result,
+    sensitive_info_count,
+    email_count,
+    ssn_count{_BY_DOCUMENT_ID}"""
+
+_Q_GET_DOC_META: Final[str] = f"""
+SELECT
+    document_id,
+    filename,
+    upload_timestamp,
+    content_length,
+    analysis_result,
+    sensitive_info_count,
+    email_count,
+    ssn_count{_BY_DOCUMENT_ID}"""
+
+# Pulls the analysis statistics out of the stored JSON server-side
+_Q_GET_DOC_STATS: Final[str] = f"""
+SELECT
+    JSONExtractUInt(analysis_result, 'statistics', 'total_chars_processed'),
+    JSONExtractUInt(analysis_result, 'statistics', 'total_findings'),
+    JSONExtractUInt(analysis_result, 'statistics', 'findings_by_type', 'email'),
+    JSONExtractUInt(analysis_result, 'statistics', 'findings_by_type', 'ssn'),
+    JSONExtractFloat(analysis_result, 'statistics', 'processing_time'){_BY_DOCUMENT_ID}"""
+
+# Existence only: a stored row, whether or not a later upload has replaced it
+_Q_DOC_EXISTS: Final[str] = """
+SELECT 1
+FROM documents
+WHERE document_id = {document_id:String}
+LIMIT 1
+"""
+
+_Q_GET_BY_FILENAME: Final[str] = """
+SELECT
+    document_id,
+    filename,
+    upload_timestamp,
+    content,
+    content_length,
+    analysis_result,
+    sensitive_info_count,
+    email_count,
+    ssn_count
+FROM documents FINAL
+WHERE filename = {filename:String}
+LIMIT 1
+"""
+
+_LIST_COLUMNS: Final[str] = """
+    document_id,
+    filename,
+    upload_timestamp,
+    content_length,
+    sensitive_info_count,
+    email_count,
+    ssn_count"""
+
+# The page is picked from the narrow (filename, version, upload_timestamp) columns
+# alone; wide columns are then read only for the page's filenames, a primary-key
+# lookup, instead of merging every column of the table with FINAL
+_LIST_PAGE: Final[str] = """
+FROM documents
+WHERE (filename, version) IN (
+    SELECT filename, max(version)
+    FROM documents
+    GROUP BY filename
+    ORDER BY argMax(upload_timestamp, version) DESC
+    LIMIT {limit:UInt32}
+    OFFSET {offset:UInt32}
+)
+ORDER BY upload_timestamp DESC
+"""
+
+_Q_LIST_DOCS: Final[str] = f"SELECT {_LIST_COLUMNS}{_LIST_PAGE}"
+
+# Only when asked for: content is by far the widest column to read
+_Q_LIST_DOCS_WITH_CONTENT: Final[str] = f"SELECT {_LIST_COLUMNS},\n    content{_LIST_PAGE}"
+
+# Reads the running aggregates kept by documents_stats_mv; O(1) in the table size
+_Q_STATS: Final[str] = """
+SELECT
+    countMerge(total_documents),
+    sumMerge(total_sensitive_info),
+    sumMerge(total_emails),
+    sumMerge(total_ssns),
+    avgMerge(avg_sensitive_per_doc),
+    maxMerge(max_sensitive_in_doc)
+FROM documents_stats
+"""
+
+# No IF NOT EXISTS: exactly one process creates the table, and only that one backfills it
+_Q_CREATE_STATS_TABLE: Final[str] = """
+CREATE TABLE documents_stats (
+    total_documents AggregateFunction(count),
+    total_sensitive_info AggregateFunction(sum, UInt32),
+    total_emails AggregateFunction(sum, UInt32),
+    total_ssns AggregateFunction(sum, UInt32),
+    avg_sensitive_per_doc AggregateFunction(avg, UInt32),
+    max_sensitive_in_doc AggregateFunction(max, UInt32)
+)
+ENGINE = AggregatingMergeTree()
+ORDER BY tuple()
+"""
+
+_STATS_STATES: Final[str] = """
+    countState() AS total_documents,
+    sumState(sensitive_info_count) AS total_sensitive_info,
+    sumState(email_count) AS total_emails,
+    sumState(ssn_count) AS total_ssns,
+    avgState(sensitive_info_count) AS avg_sensitive_per_doc,
+    maxState(sensitive_info_count) AS max_sensitive_in_doc
+"""
+
+# Counts rows stamped from the cutoff on; the backfill counts the ones before it.
+# Filled in with str.format, as DDL takes no query parameters
+_Q_CREATE_STATS_VIEW: Final[str] = f"""
+CREATE MATERIALIZED VIEW IF NOT EXISTS documents_stats_mv TO documents_stats AS
+SELECT {_STATS_STATES}
+FROM documents
+WHERE upload_timestamp >= fromUnixTimestamp64Milli(toInt64({{cutoff_ms}}), 'UTC')
+"""
+
+# Server clock, the same one that stamps upload_timestamp
+_Q_NOW_MS: Final[str] = "SELECT toUnixTimestamp64Milli(now64(3, 'UTC'))"
+
+_Q_BACKFILL_STATS: Final[str] = f"""
+INSERT INTO documents_stats
+SELECT {_STATS_STATES}
+FROM documents
+WHERE upload_timestamp < fromUnixTimestamp64Milli({{cutoff_ms:Int64}}, 'UTC')
+"""
+
+def _row_to_doc(row: tuple) -> Dict[str, Any]:
+    """Convert a _Q_GET_DOC / _Q_GET_BY_FILENAME row into a document dict."""
+    (document_id, filename, upload_timestamp, content, content_length,
+     analysis_result, sensitive_info_count, email_count, ssn_count) = row
+    return {
+        'document_id': document_id,
+        'filename': filename,
+        'upload_timestamp': upload_timestamp.isoformat(),
+        'content': content,
+        'content_length': content_length,
+        'analysis_result': orjson.loads(analysis_result),
+        'sensitive_info_count': sensitive_info_count,
+        'email_count': email_count,
+        'ssn_count': ssn_count
+    }
+
+def _row_to_meta(row: tuple) -> Dict[str, Any]:
+    """Convert a _Q_GET_DOC_META row into a document dict without content."""
+    (document_id, filename, upload_timestamp, content_length,
+     analysis_result, sensitive_info_count, email_count, ssn_count) = row
+    return {
+        'document_id': document_id,
+        'filename': filename,
+        'upload_timestamp': upload_timestamp.isoformat(),
+        'content_length': content_length,
+        'analysis_result': orjson.loads(analysis_result),
+        'sensitive_info_count': sensitive_info_count,
+        'email_count': email_count,
+        'ssn_count': ssn_count
+    }
+
+def _row_to_stats(row: tuple) -> Dict[str, Any]:
+    """Convert a _Q_GET_DOC_STATS row into a statistics dict."""
+    total_chars_processed, total_findings, email_count, ssn_count, processing_time = row
+    return {
+        'total_chars_processed': total_chars_processed,
+        'total_findings': total_findings,
+        'findings_by_type': {'email': email_count, 'ssn': ssn_count},
+        'processing_time': processing_time
+    }
+
+def _catch(op: str, default: Any = None):
+    """Log a failed ClickHouse operation and return a fallback instead of raising."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                logger.exception("%s failed", op)
+                return default() if callable(default) else default
+        return wrapper
+    return decorator
+
+def _retry_transient(attempts: int = 3, base_delay: float = 0.1, max_delay: float = 2.0):
+    """Retry on dropped connections and socket timeouts with jittered exponential backoff."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            for attempt in range(attempts):
+                try:
+                    return func(*args, **kwargs)
+                except (NetworkError, SocketTimeoutError) as e:
+                    if attempt == attempts - 1:
+                        raise
+                    delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+                    logger.warning("%s attempt %d/%d failed (%s), retrying in %.2fs", func.__name__, attempt + 1, attempts, e, delay)
+                    time.sleep(delay)
+        return wrapper
+    return decorator
+
 class ConnectionPool:
-    def __init__(self, size: int, **db_params):
-        self.size = size
+    __slots__ = (
+        'min_size', 'max_size', 'probe_interval', 'db_params', 'pool', 'lock', '_created', '_closed',
+        '_last_used', '_prober'
+    )
+
+    def __init__(self, min_size: int, max_size: int, probe_interval: float = 30.0, **db_params):
+        self.min_size = min_size
+        self.max_size = max(min_size, max_size)
+        self.probe_interval = probe_interval
         self.db_params = db_params
-        self.pool: Queue[Client] = Queue(maxsize=size)
+        # LIFO keeps the most recently used (warm TLS/TCP) connections in rotation
+        self.pool: LifoQueue[Client] = LifoQueue(maxsize=self.max_size)
         self.lock = threading.Lock()
+        self._created = 0
+        self._closed = threading.Event()
+        # Monotonic time each connection was last returned after a successful query
+        self._last_used: Dict[Client, float] = {}
         self._fill_pool()
+        # Periodically validate idle connections so a dropped socket is
+        # replaced in the background rather than on a request
+        self._prober = threading.Thread(target=self._probe_idle, name="clickhouse-pool-probe", daemon=True)
+        self._prober.start()
 
     def _fill_pool(self):
-        for _ in range(self.size):
+        for _ in range(self.min_size):
             client = Client(**self.db_params)
             self.pool.put(client)
+            self._created += 1
 
-    @contextmanager
-    def get_connection(self):
-        connection = None
+    def _acquire(self) -> Client:
         try:
-            connection = self.pool.get(timeout=5)  # 5 second timeout
-            yield connection
-        finally:
-            if connection:
+            return self.pool.get_nowait()
+        except Empty:
+            pass
+        # Grow on demand up to max_size; only block once every connection is in use
+        with self.lock:
+            grow = self._created < self.max_size
+            if grow:
+                self._created += 1
+        if grow:
+            try:
+                return Client(**self.db_params)
+            except Exception:
+                with self.lock:
+                    self._created -= 1
+                raise
+        return self.pool.get(timeout=5)  # 5 second timeout
+
+    def _replace(self, connection: Client):
+        self._last_used.pop(connection, None)
+        connection.disconnect()
+        # Create new connection to replace the bad one
+        try:
+            self.pool.put(Client(**self.db_params))
+        except Exception as e:
+            logger.error("Failed to create new connection: %s", e)
+            with self.lock:
+                self._created -= 1
+
+    def _probe_idle(self):
+        while not self._closed.wait(self.probe_interval):
+            # Take every idle connection first: with a LIFO pool a probed connection
+            # would otherwise be put back on top and picked again
+            idle = []
+            while True:
+                try:
+                    idle.append(self.pool.get_nowait())
+                except Empty:
+                    break
+            now = time.monotonic()
+            for connection in idle:
+                # A connection that served a query within the interval is known good
+                if now - self._last_used.get(connection, 0.0) < self.probe_interval:
+                    self.pool.put(connection)
+                    continue
                 try:
                     # Test if connection is still good
                     connection.execute('SELECT 1')
+                    self._last_used[connection] = time.monotonic()
                     self.pool.put(connection)
                 except Exception as e:
-                    logger.error(f"Connection error, creating new one: {e}")
-                    # Create new connection to replace the bad one
-                    try:
-                        new_conn = Client(**self.db_params)
-                        self.pool.put(new_conn)
-                    except Exception as e:
-                        logger.error(f"Failed to create new connection: {e}")
+                    logger.error("Idle connection error, creating new one: %s", e)
+                    self._replace(connection)
+
+    @contextmanager
+    def get_connection(self):
+        connection = self._acquire()
+        broken = False
+        try:
+            yield connection
+        except (NetworkError, SocketTimeoutError, EOFError) as e:
+            logger.error("Connection error, creating new one: %s", e)
+            broken = True
+            raise
+        finally:
+            # An unusable socket is swapped out instead of being handed to the next caller
+            if broken:
+                self._replace(connection)
+            else:
+                self._last_used[connection] = time.monotonic()
+                self.pool.put(connection)
+
+    def close(self):
+        """Stop the idle probe and disconnect all pooled connections."""
+        self._closed.set()
+        self._last_used.clear()
+        while True:
+            try:
+                self.pool.get_nowait().disconnect()
+            except Empty:
+                break
 
 class ClickHouseClient:
-    def __init__(self, host: str = 'localhost', port: int = 9000, username: str = 'default', password: str = ''):
+    __slots__ = (
+        'db_params', 'pool', '_doc_cache', '_filename_cache', '_stats_cache', '_miss_cache'
+    )
+
+    # Connection-level config shared by every pooled client
+    SECURE = True
+    # Block compression (LZ4 by default); document text compresses well on the wire
+    COMPRESSION = settings.CLICKHOUSE_COMPRESSION if settings.CLICKHOUSE_COMPRESSION != 'none' else False
+    # Fail fast on dead sockets; transient errors are retried by the caller
+    CONNECT_TIMEOUT = 10
+    SEND_RECEIVE_TIMEOUT = 30
+    # Keep idle pooled sockets (and their TLS sessions) alive through NAT/LB idle
+    # timeouts: (idle_s, interval_s, probes) before the kernel declares them dead
+    TCP_KEEPALIVE = (60, 10, 3)
+    MAX_EXECUTION_TIME = 60
+    # How far ahead of the server clock the stats view starts counting
+    STATS_CUTOFF_MARGIN_MS = 2000
+    # Let the server coalesce concurrent inserts (e.g. from several workers) into one part
+    INSERT_SETTINGS = {
+        'async_insert': 1,
+        'wait_for_async_insert': 1,
+        # Document batches are large; older servers flush at 1 MB, well before the timeout
+        'async_insert_max_data_size': 10_000_000,
+        'async_insert_busy_timeout_ms': 1000
+    }
+
+    # Servers whose schema has already been checked by this process; reconnects skip the check
+    _tables_ready: ClassVar[Set[Tuple[str, int]]] = set()
+
+    def __init__(self, host: str = 'localhost', port: int = 9440, username: str = 'default', password: str = '',
+                 pool_min: Optional[int] = None, pool_max: Optional[int] = None):
         try:
             self.db_params = {
                 'host': host,
                 'user': username,
-                'secure': True,
+                'secure': self.SECURE,
                 'port': port,
                 'password': password,
+                'compression': self.COMPRESSION,
+                'connect_timeout': self.CONNECT_TIMEOUT,
+                'send_receive_timeout': self.SEND_RECEIVE_TIMEOUT,
+                'tcp_keepalive': self.TCP_KEEPALIVE,
                 'settings': {
-                    'max_execution_time': 60
+                    'max_execution_time': self.MAX_EXECUTION_TIME,
+                    # Bind {name:Type} parameters on the server so each query shape has one text
+                    'server_side_params': True
                 }
             }
             
-            # Create a connection pool with 5 connections
-            self.pool = ConnectionPool(5, **self.db_params)
+            # Create a connection pool that grows from pool_min up to pool_max
+            # (min(32, cpu*2) by default) connections as concurrency demands
+            self.pool = ConnectionPool(
+                pool_min or settings.CLICKHOUSE_POOL_MIN,
+                pool_max or settings.CLICKHOUSE_POOL_SIZE,
+                probe_interval=settings.CLICKHOUSE_POOL_PROBE_INTERVAL,
+                **self.db_params
+            )
+            
+            # Hot-key read caches; store_documents_batch invalidates affected entries
+            self._doc_cache = TTLCache(settings.DOCUMENT_CACHE_SIZE, settings.DOCUMENT_CACHE_TTL)
+            self._filename_cache = TTLCache(settings.DOCUMENT_CACHE_SIZE, settings.DOCUMENT_CACHE_TTL)
+            self._stats_cache = TTLCache(1, settings.STATISTICS_CACHE_TTL)
+            # Recent filename lookups that found nothing, kept apart so misses can't evict hot
+            # documents. Well-formed document IDs are never negative-cached: a new upload may be
+            # written by another worker, which could not invalidate this cache
+            self._miss_cache = TTLCache(settings.DOCUMENT_CACHE_SIZE, settings.NEGATIVE_CACHE_TTL)
             
             # Test the connection and create table
             with self.pool.get_connection() as client:
                 self._test_connection(client)
-                self._ensure_table_exists(client)
+                logger.info("Successfully connected to ClickHouse")
+                if (host, port) not in ClickHouseClient._tables_ready:
+                    self._ensure_table_exists(client)
+                    ClickHouseClient._tables_ready.add((host, port))
                 
         except Exception as e:
-            logger.error(f"Error connecting to ClickHouse: {str(e)}")
+            logger.error("Error connecting to ClickHouse: %s", e)
+            # Stop the idle prober and drop its connections; the caller will retry with a new client
+            pool = getattr(self, 'pool', None)
+            if pool is not None:
+                pool.close()
             raise
 
-    def _test_connection(self, client: Client):
+    def close(self):
+        """Release all pooled connections."""
+        self.pool.close()
+
+    def _test_connection(self, client: Optional[Client] = None):
+        if client is None:
+            with self.pool.get_connection() as client:
+                return self._test_connection(client)
         result = client.execute('SELECT 1')
-        if result:
-            logger.info("Successfully connected to ClickHouse")
-        else:
+        if not result:
             raise Exception("Connection test returned no results")
 
     def _ensure_table_exists(self, client: Client):
         try:
-            check_query = """
-            SELECT name
-            FROM system.tables
-            WHERE database = currentDatabase()
-            AND name = 'documents'
-            """
-            result = client.execute(check_query)
+            result = client.execute(_Q_CHECK_TABLE, {'table': 'documents'})
 
-            if not result:
-                create_table_query = """
-                CREATE TABLE IF NOT EXISTS documents (
-                    document_id String,
-                    filename String,
-                    upload_timestamp DateTime64(3, 'UTC'),
-                    content String,
-                    content_length UInt32,
-                    analysis_result String,
-                    sensitive_info_count UInt32,
-                    email_count UInt32,
-                    ssn_count UInt32
-                )
-                ENGINE = MergeTree()
-                PRIMARY KEY (document_id)
-                ORDER BY (upload_timestamp, document_id)
-                SETTINGS index_granularity = 8192
-                """
-                client.execute(create_table_query)
+            legacy = None
+            if result and not _VERSIONED_ENGINE_RE.search(result[0][0]):
+                # Plain MergeTree tables from before deduplication moved into the engine, and
+                # ReplacingMergeTree tables versioned by the server timestamp, are copied into
+                # a table versioned by the client; the old table is kept for the operator
+                legacy = 'documents_unversioned' if 'ReplacingMergeTree' in result[0][0] else 'documents_legacy'
+                if client.execute(_Q_CHECK_TABLE, {'table': legacy}):
+                    # Another process is migrating (the retry will find the new table), or an
+                    # earlier copy was kept; inserts would fail against the old schema
+                    raise RuntimeError(f"Table '{legacy}' already exists; drop it once verified to migrate 'documents'")
+                # Renamed first, so a failed rename leaves the stats view in place
+                client.execute(f"RENAME TABLE documents TO {legacy}")
+                client.execute("DROP TABLE IF EXISTS documents_stats_mv")
+                # Rebuilt and backfilled from the copied rows by _ensure_stats_view
+                client.execute("DROP TABLE IF EXISTS documents_stats")
+                logger.info("Renamed table 'documents' to '%s'", legacy)
+
+            if not result or legacy:
+                client.execute(_Q_CREATE_TABLE)
                 logger.info("Created table 'documents'")
             else:
                 logger.info("Table 'documents' already exists")
+                for (column,) in client.execute(_Q_UNCOMPRESSED_COLUMNS):
+                    # Metadata-only: new parts use ZSTD, existing ones are recompressed on merge
+                    client.execute(f"ALTER TABLE documents MODIFY COLUMN {column} String CODEC(ZSTD(3))")
+                    logger.info("Switched column '%s' to ZSTD(3)", column)
+                defaults = dict(client.execute(_Q_COLUMN_DEFAULTS))
+                if defaults.get('upload_timestamp') != 'DEFAULT':
+                    client.execute(
+                        "ALTER TABLE documents MODIFY COLUMN upload_timestamp DateTime64(3, 'UTC') DEFAULT now64(3, 'UTC')"
+                    )
+                    logger.info("Switched column 'upload_timestamp' to DEFAULT now64")
+                if defaults.get('content_length') != 'MATERIALIZED':
+                    client.execute(
+                        "ALTER TABLE documents MODIFY COLUMN content_length UInt32 MATERIALIZED lengthUTF8(content)"
+                    )
+                    logger.info("Switched column 'content_length' to MATERIALIZED")
+
+            if legacy:
+                client.execute(_Q_COPY_LEGACY.format(table=legacy))
+                logger.info("Copied rows from '%s'; drop it once verified", legacy)
+            self._ensure_stats_view(client)
         except Exception as e:
-            logger.error(f"Error with table setup: {str(e)}")
+            logger.error("Error with table setup: %s", e)
             raise
 
-    def store_document(self, document_id: str, filename: str, content: str, analysis_result: Dict[str, Any]) -> bool:
+    def _ensure_stats_view(self, client: Client):
+        """Create the aggregate table fed by documents_stats_mv, backfilling it on first creation.
+
+        The view aggregates inserts, so statistics count every processed upload,
+        including ones that later replaced an earlier document with the same filename.
+        Only the process that creates the table creates the view and backfills it.
+        """
         try:
-            stats = analysis_result.get('statistics', {})
-            findings_by_type = stats.get('findings_by_type', {})
+            client.execute(_Q_CREATE_STATS_TABLE)
+        except ServerException as e:
+            # Created by an earlier start or by another worker starting alongside this one
+            if e.code != ErrorCodes.TABLE_ALREADY_EXISTS:
+                raise
+            if not client.execute(_Q_CHECK_TABLE, {'table': 'documents_stats_mv'}):
+                logger.warning("View 'documents_stats_mv' is missing; drop table 'documents_stats' to rebuild it")
+            return
+        # Split rows between the view and the backfill at a server time slightly in the
+        # future: the view exists before any row is stamped at or after the cutoff, and
+        # the backfill waits until every row stamped before it has been written
+        cutoff_ms = client.execute(_Q_NOW_MS)[0][0] + self.STATS_CUTOFF_MARGIN_MS
+        client.execute(_Q_CREATE_STATS_VIEW.format(cutoff_ms=cutoff_ms))
+        now_ms = client.execute(_Q_NOW_MS)[0][0]
+        if now_ms >= cutoff_ms:
+            logger.warning("Creating 'documents_stats_mv' outlasted its cutoff; statistics may miss rows")
+        # Async inserts are written up to async_insert_busy_timeout_ms after being stamped
+        time.sleep((cutoff_ms - now_ms + self.INSERT_SETTINGS['async_insert_busy_timeout_ms']) / 1000 + 0.5)
+        client.execute(_Q_BACKFILL_STATS, {'cutoff_ms': cutoff_ms})
+        logger.info("Created materialized view 'documents_stats_mv'")
 
-            start_prepare = time.time()
-            data = [(
-                document_id,
-                filename,
-                datetime.utcnow(),
-                content,
-                len(content),
-                json.dumps(analysis_result),
-                stats.get('total_findings', 0),
-                findings_by_type.get('email', 0),
-                findings_by_type.get('ssn', 0)
-            )]
-            prepare_time = time.time()
-            logger.info(f"Data preparation took {(prepare_time - start_prepare):.3f}s")
+    def _invalidate(self, document_id: str, filename: str):
+        self._doc_cache.pop(document_id)
+        self._filename_cache.pop(filename)
+        self._miss_cache.pop(('filename', filename))
+        self._stats_cache.clear()
 
-            with self.pool.get_connection() as client:
-                # Check if document already exists by filename
-                start_check = time.time()
-                existing = client.execute(
-                    "SELECT document_id FROM documents WHERE filename = %(filename)s LIMIT 1",
-                    {'filename': filename}
-                )
-                check_time = time.time()
-                logger.info(f"Document existence check took {(check_time - start_check):.3f}s")
-
-                if existing:
-                    # Document exists with this filename, delete the old record and insert the new one
-                    existing_document_id = existing[0][0]
-                    logger.info(f"Document with filename '{filename}' already exists (ID: {existing_document_id}), replacing...")
-                    start_update = time.time()
-                    
-                    # Delete the existing record
-                    client.execute(
-                        "DELETE FROM documents WHERE filename = %(filename)s",
-                        {'filename': filename}
-                    )
-                    
-                    # Insert the new record
-                    client.execute(
-                        """
-                        INSERT INTO documents (
-                            document_id, filename, upload_timestamp, content,
-                            content_length, analysis_result, sensitive_info_count,
-                            email_count, ssn_count
-                        ) VALUES
-                        """,
-                        data
-                    )
-                    
-                    update_time = time.time()
-                    logger.info(f"Document replacement took {(update_time - start_update):.3f}s")
-                    logger.info(f"Total database operation took {(update_time - start_prepare):.3f}s")
-                    return True
-                else:
-                    # Document doesn't exist, insert it
-                    logger.info(f"Document with filename '{filename}' doesn't exist, inserting...")
-                    start_insert = time.time()
-                    client.execute(
-                        """
-                        INSERT INTO documents (
-                            document_id, filename, upload_timestamp, content,
-                            content_length, analysis_result, sensitive_info_count,
-                            email_count, ssn_count
-                        ) VALUES
-                        """,
-                        data
-                    )
-                    insert_time = time.time()
-                    logger.info(f"Document insert took {(insert_time - start_insert):.3f}s")
-                    logger.info(f"Total database operation took {(insert_time - start_prepare):.3f}s")
-                    return True
+    @_catch("store_documents_batch", default=False)
+    def store_documents_batch(self, documents: List[Tuple[str, str, str, Dict[str, Any]]]) -> bool:
+        """Store (document_id, filename, content, analysis_result) tuples in one INSERT."""
+        self._write_batch([self._to_row(*document) for document in documents])
+        return True
 
-        except Exception as e:
-            logger.error(f"Error storing document in ClickHouse: {str(e)}")
-            return False
+    @staticmethod
+    def _to_row(document_id: str, filename: str, content: str, analysis_result: Dict[str, Any]) -> tuple:
+        stats = analysis_result.get('statistics', {})
+        findings_by_type = stats.get('findings_by_type', {})
+        return (
+            document_id,
+            filename,
+            content,
+            orjson.dumps(analysis_result).decode(),
+            stats.get('total_findings', 0),
+            findings_by_type.get('email', 0),
+            findings_by_type.get('ssn', 0),
+            # ReplacingMergeTree version: a later upload of the same filename wins
+            time.time_ns()
+        )
+
+    @_retry_transient()
+    def _insert_rows(self, rows: List[tuple]):
+        with self.pool.get_connection() as client:
+            client.execute(
+                _Q_INSERT_DOCS,
+                list(zip(*rows)),
+                columnar=True,
+                settings=self.INSERT_SETTINGS
+            )
+
+    def _write_batch(self, rows: List[tuple]):
+        # Only the latest upload of each filename in a batch would survive; skip writing the rest
+        rows = list({row[1]: row for row in rows}.values())
+        start_write = time.time()
 
+        self._insert_rows(rows)
+
+        for row in rows:
+            # Drop the replaced document too, if its filename lookup was cached
+            replaced = self._filename_cache.get(row[1])
+            if replaced is not None:
+                self._doc_cache.pop(replaced['document_id'])
+            self._invalidate(row[0], row[1])
+        logger.debug("Batch of %d documents took %.3fs", len(rows), time.time() - start_write)
+
+    @_catch("get_document")
     def get_document(self, document_id: str) -> Optional[Dict[str, Any]]:
-        try:
-            with self.pool.get_connection() as client:
-                query = """
-                SELECT
-                    document_id,
-                    filename,
-                    upload_timestamp,
-                    content,
-                    content_length,
-                    analysis_result,
-                    sensitive_info_count,
-                    email_count,
-                    ssn_count
-                FROM documents
-                WHERE document_id = %(document_id)s
-                LIMIT 1
-                """
-                result = client.execute(query, {'document_id': document_id}, with_column_types=True)
-
-                if not result[0]:
-                    return None
-
-                row = result[0][0]
-                return {
-                    'document_id': row[0],
-                    'filename': row[1],
-                    'upload_timestamp': row[2].isoformat(),
-                    'content': row[3],
-                    'content_length': row[4],
-                    'analysis_result': json.loads(row[5]),
-                    'sensitive_info_count': row[6],
-                    'email_count': row[7],
-                    'ssn_count': row[8]
-                }
-        except Exception as e:
-            logger.error(f"Error retrieving document from ClickHouse: {str(e)}")
+        # Document IDs are UUID4 strings; anything else cannot exist, so is answered without a query
+        if not _DOCUMENT_ID_RE.fullmatch(document_id):
+            return None
+        cached = self._doc_cache.get(document_id)
+        if cached is not None:
+            return cached
+        with self.pool.get_connection() as client:
+            result = client.execute(_Q_GET_DOC, {'document_id': document_id})
+
+            if not result:
+                return None
+
+            document = _row_to_doc(result[0])
+            self._doc_cache.set(document_id, document)
+            return document
+
+    @_catch("get_document_meta")
+    def get_document_meta(self, document_id: str) -> Optional[Dict[str, Any]]:
+        """Same as get_document but without the content column."""
+        if not _DOCUMENT_ID_RE.fullmatch(document_id):
             return None
+        cached = self._doc_cache.get(document_id)
+        if cached is not None:
+            return {key: value for key, value in cached.items() if key != 'content'}
+        with self.pool.get_connection() as client:
+            result = client.execute(_Q_GET_DOC_META, {'document_id': document_id})
+
+            if not result:
+                return None
+
+            return _row_to_meta(result[0])
+
+    @_catch("document_exists", default=False)
+    def document_exists(self, document_id: str) -> bool:
+        """Whether a document has been stored; never answered from the negative cache.
+
+        Used for status polls, which may reach this worker before the write made
+        by another worker is visible, so a miss here must not be remembered.
+        """
+        if not _DOCUMENT_ID_RE.fullmatch(document_id):
+            return False
+        if self._doc_cache.get(document_id) is not None:
+            return True
+        with self.pool.get_connection() as client:
+            return bool(client.execute(_Q_DOC_EXISTS, {'document_id': document_id}))
 
+    @_catch("get_document_stats")
+    def get_document_stats(self, document_id: str) -> Optional[Dict[str, Any]]:
+        """Analysis statistics for one document, without fetching or parsing the full analysis."""
+        if not _DOCUMENT_ID_RE.fullmatch(document_id):
+            return None
+        cached = self._doc_cache.get(document_id)
+        if cached is not None:
+            # Same shape as the query result, with the same 0 for missing keys as JSONExtract
+            stats = cached['analysis_result'].get('statistics', {})
+            findings_by_type = stats.get('findings_by_type', {})
+            return _row_to_stats((
+                stats.get('total_chars_processed', 0),
+                stats.get('total_findings', 0),
+                findings_by_type.get('email', 0),
+                findings_by_type.get('ssn', 0),
+                stats.get('processing_time', 0.0)
+            ))
+        with self.pool.get_connection() as client:
+            result = client.execute(_Q_GET_DOC_STATS, {'document_id': document_id})
+
+            if not result:
+                return None
+
+            return _row_to_stats(result[0])
+
+    @_catch("get_document_by_filename")
     def get_document_by_filename(self, filename: str) -> Optional[Dict[str, Any]]:
-        try:
-            with self.pool.get_connection() as client:
-                query = """
-                SELECT
-                    document_id,
-                    filename,
-                    upload_timestamp,
-                    content,
-                    content_length,
-                    analysis_result,
-                    sensitive_info_count,
-                    email_count,
-                    ssn_count
-                FROM documents
-                WHERE filename = %(filename)s
-                ORDER BY upload_timestamp DESC
-                LIMIT 1
-                """
-                result = client.execute(query, {'filename': filename}, with_column_types=True)
-
-                if not result[0]:
-                    return None
-
-                row = result[0][0]
-                return {
-                    'document_id': row[0],
-                    'filename': row[1],
-                    'upload_timestamp': row[2].isoformat(),
-                    'content': row[3],
-                    'content_length': row[4],
-                    'analysis_result': json.loads(row[5]),
-                    'sensitive_info_count': row[6],
-                    'email_count': row[7],
-                    'ssn_count': row[8]
-                }
-        except Exception as e:
-            logger.error(f"Error checking for existing document: {str(e)}")
+        cached = self._filename_cache.get(filename)
+        if cached is not None:
+            return cached
+        if self._miss_cache.get(('filename', filename)):
             return None
+        with self.pool.get_connection() as client:
+            result = client.execute(_Q_GET_BY_FILENAME, {'filename': filename})
+
+            if not result:
+                self._miss_cache.set(('filename', filename), True)
+                return None
+
+            document = _row_to_doc(result[0])
+            self._filename_cache.set(filename, document)
+            return document
 
+    @_catch("get_statistics", default=dict)
     def get_statistics(self) -> Dict[str, Any]:
-        try:
-            with self.pool.get_connection() as client:
-                query = """
-                SELECT
-                    count() as total_documents,
-                    sum(sensitive_info_count) as total_sensitive_info,
-                    sum(email_count) as total_emails,
-                    sum(ssn_count) as total_ssns,
-                    avg(sensitive_info_count) as avg_sensitive_per_doc,
-                    max(sensitive_info_count) as max_sensitive_in_doc
-                FROM documents
-                """
-                result = client.execute(query)
-                if not result:
-                    return {}
-                row = result[0]
-                return {
-                    'total_documents': row[0],
-                    'total_sensitive_info': row[1],
-                    'total_emails': row[2],
-                    'total_ssns': row[3],
-                    'avg_sensitive_per_doc': float(row[4]),
-                    'max_sensitive_in_doc': row[5]
-                }
-        except Exception as e:
-            logger.error(f"Error getting statistics from ClickHouse: {str(e)}")
-            return {}
+        cached = self._stats_cache.get('statistics')
+        if cached is not None:
+            return cached
+        with self.pool.get_connection() as client:
+            # Merging a handful of partial states: parallel pipeline setup costs more than it saves
+            result = client.execute(_Q_STATS, settings={'max_threads': 1})
+            if not result:
+                return {}
+            row = result[0]
+            stats = {
+                'total_documents': row[0],
+                'total_sensitive_info': row[1],
+                'total_emails': row[2],
+                'total_ssns': row[3],
+                'avg_sensitive_per_doc': float(row[4]),
+                'max_sensitive_in_doc': row[5]
+            }
+            self._stats_cache.set('statistics', stats)
+            return stats
 
-    def get_all_documents(self, limit: int = 100, offset: int = 0) -> List[Dict[str, Any]]:
-        try:
-            with self.pool.get_connection() as client:
-                query = """
-                SELECT
-                    document_id,
-                    filename,
-                    upload_timestamp,
-                    content_length,
-                    sensitive_info_count,
-                    email_count,
-                    ssn_count
-                FROM documents
-                ORDER BY upload_timestamp DESC
-                LIMIT %(limit)s
-                OFFSET %(offset)s
-                """
-                result = client.execute(
-                    query,
-                    {'limit': limit, 'offset': offset},
-                    with_column_types=True
-                )
-
-                if not result[0]:
-                    return []
-
-                documents = []
-                for row in result[0]:
-                    documents.append({
-                        'document_id': row[0],
-                        'filename': row[1],
-                        'upload_timestamp': row[2].isoformat(),
-                        'content_length': row[3],
-                        'sensitive_info_count': row[4],
-                        'email_count': row[5],
-                        'ssn_count': row[6]
-                    })
-                return documents
-        except Exception as e:
-            logger.error(f"Error retrieving documents from ClickHouse: {str(e)}")
-            return [] 
\ No newline at end of file
+    @_catch("get_all_documents", default=list)
+    def get_all_documents(self, limit: int = 100, offset: int = 0, include_content: bool = False) -> List[Dict[str, Any]]:
+        query = _Q_LIST_DOCS_WITH_CONTENT if include_content else _Q_LIST_DOCS
+        with self.pool.get_connection() as client:
+            result = client.execute(query, {'limit': limit, 'offset': offset})
+
+            documents = []
+            for row in result:
+                document = {
+                    'document_id': row[0],
+                    'filename': row[1],
+                    'upload_timestamp': row[2].isoformat(),
+                    'content_length': row[3],
+                    'sensitive_info_count': row[4],
+                    'email_count': row[5],
+                    'ssn_count': row[6]
+                }
+                if include_content:
+                    document['content'] = row[7]
+                documents.append(document)
+            return documents
\ No newline at end of file
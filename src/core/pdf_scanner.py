@@ -0,0 +1,64 @@
+import pypdfium2 as pdfium  # Replace PyMuPDF with pypdfium2
+import ctypes
+from typing import Any, Dict, Iterator, Optional, Tuple, Union
+import logging
+import time
+from .text_processor import PDFTextProcessor
+
+logger = logging.getLogger(__name__)
+
+# Built by init_worker in each pool process; web workers import this module but never scan.
+# The patterns themselves are compiled when the fork server preloads this module
+_text_processor: Optional[PDFTextProcessor] = None
+
+def iter_pdf_pages(content: Union[bytes, bytearray], max_pages: int = 3) -> Iterator[str]:
+    """Yield the text of the first max_pages pages of an in-memory PDF, one page at a time."""
+    # Load straight from memory (FPDF_LoadMemDocument64): a BytesIO would be read
+    # through Python callbacks. A bytearray is wrapped without copying; it must
+    # stay alive, and unresized, until the document is closed
+    if isinstance(content, bytearray):
+        content = (ctypes.c_char * len(content)).from_buffer(content)
+    pdf_document = pdfium.PdfDocument(content)
+    try:
+        for page_num in range(min(max_pages, len(pdf_document))):
+            page = pdf_document.get_page(page_num)
+            text_page = page.get_textpage()
+            text = text_page.get_text_range()
+            text_page.close()
+            page.close()
+            yield text
+    finally:
+        pdf_document.close()
+
+def extract_pdf_text(content: Union[bytes, bytearray], max_pages: int = 3) -> str:
+    """Extract text from the first max_pages pages of an in-memory PDF."""
+    # Collect page text and join once; repeated += copies the accumulated string
+    return "".join(iter_pdf_pages(content, max_pages))
+
+def init_worker():
+    """ProcessPoolExecutor initializer: set up logging and the text processor."""
+    global _text_processor
+    # The parent's QueueHandler is drained by a listener thread the worker does
+    # not have (whether forked or started from the fork server), so log to stderr
+    logging.basicConfig(level=logging.INFO, force=True)
+    _text_processor = PDFTextProcessor()
+
+def scan_pdf(content: Union[bytes, bytearray], max_pages: int = 3) -> Tuple[str, Dict[str, Any], float, float]:
+    """Extract text and scan it for sensitive information.
+
+    Runs in a pool process set up by init_worker, so parsing and matching stay
+    off the event loop.
+    Returns the text, the analysis result and the extraction and processing
+    times in seconds.
+    """
+    start_time = time.time()
+    try:
+        # Each page is scanned as soon as it is extracted
+        pdf_text, analysis_result = _text_processor.process_pages(iter_pdf_pages(content, max_pages))
+    except Exception as e:
+        logger.error("Error extracting text from PDF: %s", e)
+        # Continue with empty text rather than failing
+        pdf_text = ""
+        analysis_result = _text_processor.process_text(pdf_text)
+    processing_time = analysis_result['statistics']['processing_time']
+    return pdf_text, analysis_result, time.time() - start_time - processing_time, processing_time
@@ -1,43 +1,41 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterable, List, NamedTuple, Tuple
 import re
 import time
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Compiled once per process and shared by every handler
+_EMAIL_RE = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b')
+# ASCII: \d is a plain [0-9] range check, and non-ASCII digits are never SSNs
+_SSN_RE = re.compile(r'\b\d{3}-?\d{2}-?\d{4}\b', re.ASCII)
+_PATTERNS: Tuple[Tuple[str, re.Pattern], ...] = (('email', _EMAIL_RE), ('ssn', _SSN_RE))
+
+class SensitiveInfo(NamedTuple):
+    """A single finding; converted to a dict only when building the response."""
+    type: str
+    value: str
+    start: int
+    end: int
+
 class TextHandler(ABC):
     @abstractmethod
-    def process(self, text: str) -> List[Dict[str, Any]]:
+    def process(self, text: str) -> List[SensitiveInfo]:
         pass
 
 class RegexHandler(TextHandler):
-    def __init__(self):
-        # Compile regex patterns once at initialization
-        self.patterns = {
-            'email': re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b'),
-            'ssn': re.compile(r'\b\d{3}-?\d{2}-?\d{4}\b')
-        }
-
-    def process(self, text: str) -> List[Dict[str, Any]]:
+    def process(self, text: str) -> List[SensitiveInfo]:
         findings = []
-        for pattern_type, pattern in self.patterns.items():
+        for pattern_type, pattern in _PATTERNS:
             findings.extend(self._find_matches(text, pattern, pattern_type))
         return findings
 
-    def _find_matches(self, text: str, pattern: re.Pattern, pattern_type: str) -> List[Dict[str, Any]]:
-        matches = pattern.finditer(text)
-        findings = []
-        
-        for match in matches:
-            findings.append({
-                'type': pattern_type,
-                'value': match.group(),
-                'start': match.start(),
-                'end': match.end()
-            })
-        
-        return findings
+    def _find_matches(self, text: str, pattern: re.Pattern, pattern_type: str) -> List[SensitiveInfo]:
+        return [
+            SensitiveInfo(pattern_type, match.group(), match.start(), match.end())
+            for match in pattern.finditer(text)
+        ]
 
 class PDFTextProcessor:
     def __init__(self):
@@ -46,28 +44,53 @@ class PDFTextProcessor:
     def process_text(self, text: str) -> Dict[str, Any]:
         start_time = time.time()
         
-        all_findings = []
-        findings_by_type = {}
-        
+        findings = []
         for handler in self.handlers:
-            findings = handler.process(text)
-            all_findings.extend(findings)
-            
-            # Group findings by type
-            for finding in findings:
-                finding_type = finding['type']
-                if finding_type not in findings_by_type:
-                    findings_by_type[finding_type] = 0
-                findings_by_type[finding_type] += 1
+            findings.extend(handler.process(text))
+        
+        return self._build_result(findings, len(text), time.time() - start_time)
+
+    def process_pages(self, pages: Iterable[str]) -> Tuple[str, Dict[str, Any]]:
+        """Scan each page as it arrives, then join them; returns the text and the analysis.
+
+        A page is scanned while it is still hot in cache rather than in a second
+        pass over the joined text. Matches do not span page boundaries.
+        """
+        parts = []
+        findings = []
+        offset = 0
+        process_time = 0.0
+        for page in pages:
+            start_time = time.time()
+            for handler in self.handlers:
+                findings.extend(
+                    finding._replace(start=finding.start + offset, end=finding.end + offset)
+                    for finding in handler.process(page)
+                )
+            process_time += time.time() - start_time
+            parts.append(page)
+            offset += len(page)
+        
+        return "".join(parts), self._build_result(findings, offset, process_time)
+
+    def _build_result(self, findings: List[SensitiveInfo], chars_processed: int, process_time: float) -> Dict[str, Any]:
+        all_findings = [finding._asdict() for finding in findings]
+        
+        # Group findings by type
+        findings_by_type = {}
+        for finding in findings:
+            finding_type = finding.type
+            if finding_type not in findings_by_type:
+                findings_by_type[finding_type] = 0
+            findings_by_type[finding_type] += 1
         
-        process_time = time.time() - start_time
-        logger.info(f"Total text processing took {process_time:.3f}s")
+        logger.debug("Total text processing took %.3fs", process_time)
         
         return {
             'success': True,
             'findings': all_findings,
             'statistics': {
-                'total_chars_processed': len(text),
+                'total_chars_processed': chars_processed,
                 'handlers_used': len(self.handlers),
                 'total_findings': len(all_findings),
                 'findings_by_type': findings_by_type,
@@ -0,0 +1,19 @@
+# Production entrypoint: gunicorn -c gunicorn.conf.py main:app (run from src/)
+import os
+import sys
+
+# The config is loaded before gunicorn puts its working directory on sys.path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from core.config import settings
+
+worker_class = "uvicorn.workers.UvicornWorker"
+# Read through settings so a value set only in .env matches the PDF_WORKERS split
+workers = settings.WEB_CONCURRENCY
+# Import main once in the master; web workers fork from it. Connections, the write queue
+# task and the extraction pool are created per worker in lifespan, and the pool's processes
+# start from that worker's fork server, which preloads core.pdf_scanner
+preload_app = True
+bind = f"{settings.API_HOST}:{settings.API_PORT}"
+timeout = 60
+keepalive = 30
+worker_connections = 1000
@@ -1,106 +1,279 @@
-from fastapi import FastAPI, UploadFile, HTTPException, Header, Query, BackgroundTasks
-from fastapi.responses import JSONResponse, Response
+from fastapi import FastAPI, UploadFile, HTTPException, Header, Query, BackgroundTasks, Request, Depends
+from fastapi.responses import ORJSONResponse, PlainTextResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
-import pypdfium2 as pdfium  # Replace PyMuPDF with pypdfium2
+from fastapi.concurrency import run_in_threadpool
 import uuid
-import os
+import hashlib
 import time
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
 from enum import Enum
-from core.text_processor import PDFTextProcessor
+from core.pdf_scanner import init_worker, scan_pdf
 from core.db_client import ClickHouseClient
-from dotenv import load_dotenv
-import psutil
+from core.config import settings
+from core.cache import TTLCache
 import logging
-import aiofiles
+from logging.handlers import QueueHandler, QueueListener
+import queue
 import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from contextlib import asynccontextmanager
-from io import BytesIO
 
-# Load environment variables
-load_dotenv()
-
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure logging; records are handed to a background listener so request
+# handlers never block on stderr. The listener thread is started in lifespan:
+# threads do not survive the fork into preloaded gunicorn workers
+log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+log_listener = QueueListener(log_queue, logging.StreamHandler())
+logging.basicConfig(level=logging.INFO, handlers=[QueueHandler(log_queue)])
 logger = logging.getLogger(__name__)
 
 class APIVersion(str, Enum):
     V1 = "1.0"
     V2 = "2.0"
 
+SUPPORTED_VERSIONS_DETAIL = f"Unsupported API version. Supported versions: {[v.value for v in APIVersion]}"
+
+async def require_v1(api_version: Optional[str] = Header(None, alias="X-API-Version")) -> APIVersion:
+    """Dependency rejecting requests for any API version other than V1."""
+    if api_version and api_version != APIVersion.V1.value:
+        raise HTTPException(status_code=400, detail=SUPPORTED_VERSIONS_DETAIL)
+    return APIVersion.V1
+
 # Initialize processors and clients
-text_processor = PDFTextProcessor()
+pdf_executor: Optional[ProcessPoolExecutor] = None
+# Processed uploads waiting to be written; drained in batches by write_documents.
+# Bounded so a slow database pushes back on uploads instead of growing memory
+write_queue: "asyncio.Queue[Optional[Tuple[str, str, str, Dict]]]" = asyncio.Queue(maxsize=settings.WRITE_QUEUE_SIZE)
 db_client = None
+# Guards init_db_client so concurrent requests share one reconnect
+db_client_lock = asyncio.Lock()
+# Reconnect started by a health check, which does not wait for it
+db_reconnect_task: Optional[asyncio.Task] = None
+# Last database probe result; frequent liveness probes share one round-trip
+health_cache = TTLCache(1, settings.HEALTH_CHECK_TTL)
+# Uploads accepted by upload_pdf_async, waiting to be extracted and scanned. Items
+# hold raw PDFs, so only a few per pool process may wait before uploads are held back
+scan_queue: "asyncio.Queue[Optional[Tuple[str, str, bytearray, bytes]]]" = asyncio.Queue(maxsize=settings.PDF_WORKERS * 4)
+# Pipeline state of recent asynchronous uploads: accepted, processing, stored or failed
+upload_status = TTLCache(settings.DOCUMENT_CACHE_SIZE, 600)
+# Recent scan results keyed by the SHA-256 of the uploaded bytes
+scan_cache = TTLCache(settings.DOCUMENT_CACHE_SIZE, settings.DOCUMENT_CACHE_TTL)
 max_retries = 3
+health_probe_timeout = 1.0  # seconds
 retry_delay = 5  # seconds
 
-def init_db_client():
-    """Initialize the database client with retries."""
+async def init_db_client():
+    """Initialize the database client with retries, without blocking the event loop."""
     global db_client
     for attempt in range(max_retries):
         try:
-            db_client = ClickHouseClient(
-                host=os.getenv('CLICKHOUSE_HOST', 'localhost'),
-                port=int(os.getenv('CLICKHOUSE_PORT', '9440')),
-                username=os.getenv('CLICKHOUSE_USER', 'default'),
-                password=os.getenv('CLICKHOUSE_PASSWORD', '')
+            # Connecting and checking the schema are blocking network calls
+            db_client = await run_in_threadpool(
+                ClickHouseClient,
+                host=settings.CLICKHOUSE_HOST,
+                port=settings.CLICKHOUSE_PORT,
+                username=settings.CLICKHOUSE_USER,
+                password=settings.CLICKHOUSE_PASSWORD
             )
             logger.info("Successfully initialized ClickHouse client")
             return
         except Exception as e:
-            logger.error(f"Attempt {attempt + 1}/{max_retries} to initialize ClickHouse client failed: {str(e)}")
+            logger.error("Attempt %d/%d to initialize ClickHouse client failed: %s", attempt + 1, max_retries, e)
             if attempt < max_retries - 1:
-                logger.info(f"Retrying in {retry_delay} seconds...")
-                time.sleep(retry_delay)
+                logger.info("Retrying in %d seconds...", retry_delay)
+                await asyncio.sleep(retry_delay)
             else:
                 logger.error("Failed to initialize ClickHouse client after all retries")
 
-async def store_in_db_async(document_id: str, filename: str, content: str, analysis_result: Dict):
-    """Async function to store document in database."""
+async def ensure_db_client() -> Optional[ClickHouseClient]:
+    """Return the shared client, initializing it first if needed.
+
+    The lock makes concurrent requests wait for a single initialization
+    instead of each starting their own.
+    """
+    if db_client is None:
+        async with db_client_lock:
+            if db_client is None:
+                await init_db_client()
+    return db_client
+
+async def get_db_client() -> ClickHouseClient:
+    """Return the shared client or fail the request with 503."""
+    client = await ensure_db_client()
+    if client is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Database service is currently unavailable"
+        )
+    return client
+
+async def store_in_db_async(documents: List[Tuple[str, str, str, Dict]]) -> bool:
+    """Store a batch of documents in the database; returns whether it was written."""
     try:
         start_time = time.time()
         
         # Initialize database client if needed
-        global db_client
-        if db_client is None:
-            try:
-                init_db_client()
-            except Exception as e:
-                logger.error(f"Failed to initialize database client: {str(e)}")
-                return
+        try:
+            client = await ensure_db_client()
+        except Exception as e:
+            logger.error("Failed to initialize database client: %s", e)
+            return False
         
-        if db_client is not None:
-            storage_success = db_client.store_document(
-                document_id=document_id,
-                filename=filename,
-                content=content,
-                analysis_result=analysis_result
-            )
+        if client is not None:
+            storage_success = await run_in_threadpool(client.store_documents_batch, documents)
             
             if not storage_success:
-                logger.error(f"Failed to store document {document_id} in database")
+                logger.error("Failed to store batch of %d documents in database", len(documents))
             else:
                 end_time = time.time()
-                logger.info(f"Database storage completed in {(end_time - start_time):.3f}s")
+                logger.debug("Database storage of %d documents completed in %.3fs", len(documents), end_time - start_time)
+            return storage_success
         else:
             logger.error("Database client not available for storage")
     except Exception as e:
-        logger.error(f"Error in database storage for document {document_id}: {str(e)}")
+        logger.error("Error in database storage for batch of %d documents: %s", len(documents), e)
+    return False
+
+async def write_documents():
+    """Drain write_queue, storing up to INSERT_BATCH_SIZE documents per INSERT.
+
+    A batch is flushed once it is full or INSERT_FLUSH_MS after its first
+    document arrived; a None item flushes the current batch and stops the writer.
+    """
+    loop = asyncio.get_running_loop()
+    max_wait = settings.INSERT_FLUSH_MS / 1000
+    stopping = False
+    while not stopping:
+        document = await write_queue.get()
+        if document is None:
+            break
+        batch = [document]
+        deadline = loop.time() + max_wait
+        while len(batch) < settings.INSERT_BATCH_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                # Take what is already queued without setting up a timeout
+                document = write_queue.get_nowait()
+            except asyncio.QueueEmpty:
+                try:
+                    document = await asyncio.wait_for(write_queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            if document is None:
+                stopping = True
+                break
+            batch.append(document)
+        status = "stored" if await store_in_db_async(batch) else "failed"
+        for document_id, *_ in batch:
+            # Only uploads accepted by upload_pdf_async are tracked; synchronous ones have been answered
+            if upload_status.get(document_id) is not None:
+                upload_status.set(document_id, status)
+
+async def read_pdf_upload(request: Request, file: UploadFile) -> Tuple[bytearray, bytes]:
+    """Validate and read an uploaded PDF; returns its content and SHA-256 digest."""
+    # Check if the uploaded file is a PDF
+    if not file.filename.endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="Only PDF files are allowed")
+    content_length = request.headers.get('content-length', '')
+    if content_length.isdigit() and int(content_length) > settings.MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="File too large")
+    
+    # The PDF header must appear within the first 1024 bytes; sniff it before
+    # reading the rest so non-PDFs are rejected without being buffered
+    head = await file.read(1024)
+    if b"%PDF-" not in head:
+        raise HTTPException(status_code=400, detail="Only PDF files are allowed")
+    
+    # Read the file content in chunks, stopping as soon as it exceeds the cap.
+    # Grown in place, so the chunks and a joined copy never coexist
+    content = bytearray(head)
+    digest = hashlib.sha256(head)
+    while chunk := await file.read(1 << 20):
+        content += chunk
+        digest.update(chunk)
+        if len(content) > settings.MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail="File too large")
+    return content, digest.digest()
+
+async def scan_upload(content: bytearray, content_hash: bytes) -> Tuple[str, Dict, float, float]:
+    """Extract and scan an upload in the process pool; returns text, analysis and timings."""
+    # Byte-identical re-uploads (client retries, resubmissions) reuse the earlier scan
+    scanned = scan_cache.get(content_hash)
+    if scanned is not None:
+        pdf_text, analysis_result = scanned
+        return pdf_text, analysis_result, 0.0, 0.0
+    # Extract text (first few pages only) and scan it in a worker process
+    result = await asyncio.get_running_loop().run_in_executor(pdf_executor, scan_pdf, content, 3)
+    scan_cache.set(content_hash, result[:2])
+    return result
+
+async def scan_documents():
+    """Process uploads accepted by upload_pdf_async until a None item arrives."""
+    while True:
+        upload = await scan_queue.get()
+        if upload is None:
+            break
+        document_id, filename, content, content_hash = upload
+        upload_status.set(document_id, "processing")
+        try:
+            pdf_text, analysis_result, _, _ = await scan_upload(content, content_hash)
+        except Exception as e:
+            logger.error("Error processing document %s: %s", document_id, e)
+            upload_status.set(document_id, "failed")
+            continue
+        # Stays "processing" until write_documents reports the write as stored or failed
+        await write_queue.put((document_id, filename, pdf_text, analysis_result))
+
+def pdf_mp_context() -> multiprocessing.context.BaseContext:
+    """Start method for the PDF pool: forkserver where available, else the default.
+
+    Forking the server process directly would copy its event loop and listener
+    threads into each child. The fork server imports pypdfium2 and the PII
+    patterns once, and each pool process is forked from that clean process.
+    """
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context()
+    ctx = multiprocessing.get_context('forkserver')
+    ctx.set_forkserver_preload(['core.pdf_scanner'])
+    return ctx
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifespan context manager for startup and shutdown events."""
+    global pdf_executor
+    log_listener.start()
     logger.info("Application starting up")
+    writer_task = asyncio.create_task(write_documents())
+    # PDF parsing and PII scanning are CPU-bound; run them in worker processes,
+    # sized so all web workers together use about one process per core
+    pdf_workers = settings.PDF_WORKERS
+    pdf_executor = ProcessPoolExecutor(max_workers=pdf_workers, mp_context=pdf_mp_context(), initializer=init_worker)
+    # One consumer per pool process keeps the pool busy without queueing inside it
+    scan_tasks = [asyncio.create_task(scan_documents()) for _ in range(pdf_workers)]
     # Initialize database client (optional - won't block startup)
     try:
-        init_db_client()
+        await init_db_client()
     except Exception as e:
-        logger.warning(f"Database initialization failed during startup: {str(e)}")
+        logger.warning("Database initialization failed during startup: %s", e)
     yield
     logger.info("Application shutting down")
+    # Finish accepted uploads, then flush documents still waiting to be written
+    for _ in scan_tasks:
+        await scan_queue.put(None)
+    await asyncio.gather(*scan_tasks)
+    await write_queue.put(None)
+    await writer_task
+    if db_reconnect_task is not None:
+        db_reconnect_task.cancel()
+    if db_client is not None:
+        db_client.close()
+    pdf_executor.shutdown()
+    log_listener.stop()
 
 # Initialize FastAPI app
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # Add CORS middleware
 app.add_middleware(
@@ -120,23 +293,33 @@ async def test():
 @app.get("/api/health")
 async def health_check():
     """Check the health of the API and its dependencies"""
-    global db_client
-    
-    # Try to reconnect if database is disconnected
-    if db_client is None:
-        init_db_client()
+    global db_reconnect_task
+    client = db_client
+    if client is None:
+        # Reconnecting can take several connect timeouts and retry delays; report
+        # disconnected right away and let the reconnect finish in the background
+        if db_reconnect_task is None or db_reconnect_task.done():
+            db_reconnect_task = asyncio.create_task(ensure_db_client())
     
     # Test database connection
     db_status = "disconnected"
     db_error = None
-    if db_client is not None:
-        try:
-            db_client._test_connection()
-            db_status = "connected"
-        except Exception as e:
-            db_status = "error"
-            db_error = str(e)
-            db_client = None  # Reset client on error
+    if client is not None:
+        cached = health_cache.get('database')
+        if cached is not None:
+            db_status, db_error = cached
+        else:
+            try:
+                await asyncio.wait_for(run_in_threadpool(client._test_connection), health_probe_timeout)
+                db_status = "connected"
+            except asyncio.TimeoutError:
+                db_status = "error"
+                db_error = f"No response within {health_probe_timeout}s"
+            except Exception as e:
+                # Keep the client: the pool replaces broken connections on their next use
+                db_status = "error"
+                db_error = str(e)
+            health_cache.set('database', (db_status, db_error))
     
     response = {
         "status": "healthy" if db_status == "connected" else "degraded",
@@ -149,7 +332,7 @@ async def health_check():
         }
     }
     
-    return JSONResponse(
+    return ORJSONResponse(
         content=response,
         status_code=200 if db_status == "connected" else 207
     )
@@ -157,60 +340,31 @@ async def health_check():
 @app.post("/api/v1/upload")  # Path-based versioning (backward compatible)
 @app.post("/api/upload")     # Header-based versioning
 async def upload_pdf(
+    request: Request,
     file: UploadFile,
     api_version: Optional[str] = Header(None, alias="X-API-Version")
 ):
     start_time = time.time()
     
     try:
-        # Check if the uploaded file is a PDF
-        if not file.filename.endswith('.pdf'):
-            raise HTTPException(status_code=400, detail="Only PDF files are allowed")
+        content, content_hash = await read_pdf_upload(request, file)
+        read_time = time.time()
         
         # Generate document ID
         document_id = str(uuid.uuid4())
+        logger.debug("File read completed in %.3fs", read_time - start_time)
         
-        # Read the file content
-        content = await file.read()
-        read_time = time.time()
-        logger.info(f"File read completed in {(read_time - start_time):.3f}s")
+        pdf_text, analysis_result, extraction_seconds, processing_seconds = await scan_upload(content, content_hash)
+        logger.debug("Text extraction completed in %.3fs", extraction_seconds)
+        logger.debug("Text processing completed in %.3fs", processing_seconds)
         
-        # Extract text from PDF (lightweight processing)
-        pdf_text = ""
-        try:
-            pdf_document = pdfium.PdfDocument(BytesIO(content))
-            # Only process first few pages for performance
-            max_pages = min(3, len(pdf_document))
-            for page_num in range(max_pages):
-                page = pdf_document.get_page(page_num)
-                text_page = page.get_textpage()
-                pdf_text += text_page.get_text_range()
-                text_page.close()
-                page.close()
-            pdf_document.close()
-            text_extraction_time = time.time()
-            logger.info(f"Text extraction completed in {(text_extraction_time - read_time):.3f}s")
-        except Exception as e:
-            logger.error(f"Error extracting text from PDF: {str(e)}")
-            # Continue with empty text rather than failing
-            pdf_text = ""
-            text_extraction_time = time.time()
-        
-        # Process text for sensitive information (lightweight)
-        analysis_result = text_processor.process_text(pdf_text)
-        text_processing_time = time.time()
-        logger.info(f"Text processing completed in {(text_processing_time - text_extraction_time):.3f}s")
-        
-        # Schedule database storage in background (non-blocking)
-        try:
-            asyncio.create_task(store_in_db_async(document_id, file.filename, pdf_text, analysis_result))
-        except Exception as e:
-            logger.error(f"Failed to schedule database storage: {str(e)}")
+        # Queue for batched database storage in background; waits only while the queue is full
+        await write_queue.put((document_id, file.filename, pdf_text, analysis_result))
         
         end_time = time.time()
-        logger.info(f"Request processing completed in {(end_time - start_time):.3f}s")
+        logger.debug("Request processing completed in %.3fs", end_time - start_time)
         
-        return JSONResponse(
+        return ORJSONResponse(
             content={
                 "status": "success",
                 "document_id": document_id,
@@ -219,8 +373,8 @@ async def upload_pdf(
                 "analysis": analysis_result,
                 "timing": {
                     "read": round(read_time - start_time, 3),
-                    "text_extraction": round(text_extraction_time - read_time, 3),
-                    "text_processing": round(text_processing_time - text_extraction_time, 3),
+                    "text_extraction": round(extraction_seconds, 3),
+                    "text_processing": round(processing_seconds, 3),
                     "total": round(end_time - start_time, 3)
                 }
             },
@@ -231,38 +385,73 @@ async def upload_pdf(
         raise
     except Exception as e:
         end_time = time.time()
-        logger.error(f"Error after {(end_time - start_time):.3f}s: {str(e)}")
+        logger.error("Error after %.3fs: %s", end_time - start_time, e)
         raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
 
+@app.post("/api/v1/upload_async")
+@app.post("/api/upload_async")
+async def upload_pdf_async(
+    request: Request,
+    file: UploadFile,
+    api_version: Optional[str] = Header(None, alias="X-API-Version")
+):
+    """Accept a PDF and process it in the background; poll /document/{id}/status for progress."""
+    content, content_hash = await read_pdf_upload(request, file)
+    document_id = str(uuid.uuid4())
+    upload_status.set(document_id, "accepted")
+    # Waits only while the scan queue is full
+    await scan_queue.put((document_id, file.filename, content, content_hash))
+    return ORJSONResponse(
+        content={
+            "status": "accepted",
+            "document_id": document_id,
+            "api_version": api_version or APIVersion.V1
+        },
+        status_code=202
+    )
+
+@app.get("/api/v1/document/{document_id}/status")
+@app.get("/api/document/{document_id}/status")
+async def get_document_status(
+    document_id: str,
+    api_version: APIVersion = Depends(require_v1)
+):
+    """Report how far an upload has progressed.
+
+    Pipeline states are tracked by the worker that accepted the upload; once a
+    document is stored, any worker reports it from the database. A 404 therefore
+    means the ID is unknown or still in flight on another worker.
+    """
+    status = upload_status.get(document_id)
+    if status is None:
+        # Reconnects if needed; 503 if the database is unavailable
+        client = await get_db_client()
+        if await run_in_threadpool(client.document_exists, document_id):
+            status = "stored"
+    if status is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    return {
+        "document_id": document_id,
+        "status": status,
+        "api_version": api_version
+    }
+
 @app.get("/api/v1/document/{document_id}")
 @app.get("/api/document/{document_id}")
 async def get_document(
     document_id: str,
-    api_version: Optional[str] = Header(None, alias="X-API-Version")
+    api_version: APIVersion = Depends(require_v1),
+    client: ClickHouseClient = Depends(get_db_client)
 ):
-    # Version handling logic
-    if api_version and api_version != APIVersion.V1:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Unsupported API version. Supported versions: {[v.value for v in APIVersion]}"
-        )
-
-    # Check if database is available
-    if db_client is None:
-        # Try to reconnect
-        init_db_client()
-        if db_client is None:
-            raise HTTPException(
-                status_code=503,
-                detail="Database service is currently unavailable"
-            )
-
     # Get document from ClickHouse
-    document = db_client.get_document(document_id)
+    document = await run_in_threadpool(client.get_document, document_id)
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
     
-    return {
+    # Returned as a response so FastAPI does not walk the content and findings
+    # through jsonable_encoder before orjson encodes them
+    return ORJSONResponse({
         "document_id": document_id,
         "filename": document['filename'],
         "upload_timestamp": document['upload_timestamp'],
@@ -274,36 +463,40 @@ async def get_document(
             "email_count": document['email_count'],
             "ssn_count": document['ssn_count']
         },
-        "api_version": api_version or APIVersion.V1
-    }
+        "api_version": api_version
+    })
+
+@app.get("/api/v1/document/{document_id}/content", response_class=PlainTextResponse)
+@app.get("/api/document/{document_id}/content", response_class=PlainTextResponse)
+async def get_document_content(
+    document_id: str,
+    api_version: APIVersion = Depends(require_v1),
+    client: ClickHouseClient = Depends(get_db_client)
+):
+    """Return a document's extracted text as text/plain, without JSON encoding."""
+    document = await run_in_threadpool(client.get_document, document_id)
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    return PlainTextResponse(document['content'])
 
 @app.get("/api/v1/statistics")
 @app.get("/api/statistics")
 async def get_statistics(
-    api_version: Optional[str] = Header(None, alias="X-API-Version")
+    api_version: APIVersion = Depends(require_v1),
+    client: ClickHouseClient = Depends(get_db_client)
 ):
-    """Get overall statistics about processed documents"""
-    # Version handling logic
-    if api_version and api_version != APIVersion.V1:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Unsupported API version. Supported versions: {[v.value for v in APIVersion]}"
-        )
-    
-    # Check if database is available
-    if db_client is None:
-        # Try to reconnect
-        init_db_client()
-        if db_client is None:
-            raise HTTPException(
-                status_code=503,
-                detail="Database service is currently unavailable"
-            )
+    """Get overall statistics about processed documents.
+
+    Every processed upload is counted, including re-uploads that replaced an
+    earlier document with the same filename, so total_documents can exceed the
+    number of documents listed by /documents.
+    """
     
-    stats = db_client.get_statistics()
+    stats = await run_in_threadpool(client.get_statistics)
     return {
         "statistics": stats,
-        "api_version": api_version or APIVersion.V1
+        "api_version": api_version
     }
 
 @app.get("/api/v1/documents")
@@ -311,48 +504,39 @@ async def get_statistics(
 async def get_all_documents(
     limit: int = Query(default=100, ge=1, le=1000),
     offset: int = Query(default=0, ge=0),
-    api_version: Optional[str] = Header(None, alias="X-API-Version")
+    include_content: bool = Query(default=False),
+    api_version: APIVersion = Depends(require_v1),
+    client: ClickHouseClient = Depends(get_db_client)
 ):
     """Get all documents with pagination support."""
-    # Version handling logic
-    if api_version and api_version != APIVersion.V1:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Unsupported API version. Supported versions: {[v.value for v in APIVersion]}"
-        )
-    
-    # Check if database is available
-    if db_client is None:
-        # Try to reconnect
-        init_db_client()
-        if db_client is None:
-            raise HTTPException(
-                status_code=503,
-                detail="Database service is currently unavailable"
-            )
     
     # Get documents from ClickHouse
-    documents = db_client.get_all_documents(limit=limit, offset=offset)
+    documents = await run_in_threadpool(
+        client.get_all_documents, limit=limit, offset=offset, include_content=include_content
+    )
     
-    return {
+    # Up to 1000 rows: skip the jsonable_encoder pass, as in get_document
+    return ORJSONResponse({
         "total": len(documents),
         "offset": offset,
         "limit": limit,
         "documents": documents,
-        "api_version": api_version or APIVersion.V1
-    }
+        "api_version": api_version
+    })
 
 if __name__ == "__main__":
     import uvicorn
-    import multiprocessing
 
-    # Use single worker for now to avoid potential issues
+    # Request handling is mostly I/O; CPU-bound parsing runs in each worker's
+    # process pool, so half the cores is enough for the event loops
+    workers = settings.WEB_CONCURRENCY
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=8001,
-        workers= multiprocessing.cpu_count(),
+        workers=workers,
         loop="uvloop",
+        http="httptools",
         timeout_keep_alive=30,
         log_level="info",
         reload=False  # Disable reload for production testing